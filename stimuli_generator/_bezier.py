@@ -0,0 +1,151 @@
+import json
+import numpy as np
+
+import xml.etree.ElementTree as ET
+from typing import NoReturn, Optional
+
+from beziers.point import Point
+from beziers.path import BezierPath
+from beziers.cubicbezier import CubicBezier
+from beziers.utils.legendregauss import Tvalues, Cvalues
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+_SVG_COMMANDS = str.maketrans("MCLZ", "    ")  # SVG path commands, replaced by separators
+POINT_DECIMALS = 3  # Precision of saved points (px)
+NUMBA_MIN_POINTS = 10000  # Smaller curves are sampled with NumPy, not worth numba call overhead
+
+
+def read_svg_path(file_name: str) -> str:
+    """
+    Get path data of the first path in SVG file.
+    The file is streamed and parsing stops at the first path element.
+    """
+    for event, elem in ET.iterparse(file_name, events=('start',)):
+        if elem.tag.endswith('path'):
+            return elem.attrib['d']
+    raise SyntaxError("No path element found")
+
+
+def parse_svg(svg_str: str) -> np.ndarray:
+    """
+    Parse SVG path to control points of its segments.
+    The path is expected as start point, cubic curves and final line.
+    Lines (the final one and the closing one, if path does not end at its start)
+    are stored as cubic segments with control points evenly placed on the line.
+    :param svg_str: SVG path data;
+    :return: np.ndarray of shape (n_segments, 4, 2).
+    """
+    coords = np.fromstring(svg_str.translate(_SVG_COMMANDS), sep=' ')
+    # Start point, 3 points per each cubic curve and end point of the final line
+    assert len(coords) >= 4 and (len(coords) - 4) % 6 == 0, "Expected Cubic Bezier curve!"
+    points = coords.reshape(-1, 2)
+    start, end = points[0], points[-1]
+    curves = points[1:-1].reshape(-1, 3, 2)
+    # Start points of curves, followed by start point of the final line
+    starts = np.vstack([start[None], curves[:, 2]])
+    ctrl = [np.concatenate([starts[:-1, None], curves], axis=1), [np.linspace(starts[-1], end, 4)]]
+    if not np.allclose(end, start):
+        ctrl.append([np.linspace(end, start, 4)])
+    return np.concatenate(ctrl)
+
+
+def ctrl_as_path(ctrl: np.ndarray) -> BezierPath:
+    """
+    Create BezierPath from segments control points, for display and debugging.
+    :param ctrl: control points, array of shape (n_segments, 4, 2);
+    :return: BezierPath object.
+    """
+    return BezierPath.fromSegments([CubicBezier(*[Point(x, y) for x, y in seg]) for seg in ctrl.tolist()])
+
+
+def segment_lengths(ctrl: np.ndarray) -> np.ndarray:
+    """
+    Compute length of each segment of path at once,
+    with the same Legendre-Gauss quadrature as in beziers ArcLengthMixin.
+    :param ctrl: control points, array of shape (n_segments, 4, 2);
+    :return: np.ndarray of shape (n_segments,).
+    """
+    t = 0.5 * np.asarray(Tvalues) + 0.5
+    mt = 1 - t
+    # Derivative of cubic curve is quadratic one with these control points
+    deriv = 3 * np.diff(ctrl, axis=1)
+    d = ((mt * mt)[:, None] * deriv[:, None, 0] + (2 * mt * t)[:, None] * deriv[:, None, 1]
+         + (t * t)[:, None] * deriv[:, None, 2])
+    return 0.5 * np.linalg.norm(d, axis=2) @ np.asarray(Cvalues)
+
+
+def sample_curve(ctrl: np.ndarray, n_points: int,
+                 seg_lengths: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Sample path with number of points per segment proportional to its length,
+    so that points are spread along the path evenly in arclength.
+    Each segment is sampled at equally spaced times in [0, 1).
+    :param ctrl: control points, array of shape (n_segments, 4, 2);
+    :param n_points: total number of points to sample (approximately);
+    :param seg_lengths: precomputed lengths of path segments (computed if not given);
+    :return: np.float32 array of shape (n_points, 2).
+    """
+    if seg_lengths is None:
+        seg_lengths = segment_lengths(ctrl)
+    counts = np.maximum(1, np.round(seg_lengths / seg_lengths.sum() * n_points)).astype(np.int64)
+    offsets = np.cumsum(counts) - counts
+    if njit is not None and counts.sum() >= NUMBA_MIN_POINTS:
+        out = np.empty((counts.sum(), 2), dtype=np.float64)
+        _sample_segments(np.ascontiguousarray(ctrl, dtype=np.float64), counts, offsets, out)
+        return out.astype(np.float32)
+    seg_idx = np.repeat(np.arange(len(ctrl)), counts)
+    t = (np.arange(counts.sum()) - offsets[seg_idx]) / counts[seg_idx]
+    return cubic_bezier(ctrl[seg_idx], t).astype(np.float32)
+
+
+def cubic_bezier(ctrl: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """
+    Evaluate cubic Bezier curves in explicit Bernstein form:
+    (1-t)^3 P0 + 3(1-t)^2 t P1 + 3(1-t) t^2 P2 + t^3 P3.
+    :param ctrl: control points, array of shape (4, 2) or (n_points, 4, 2);
+    :param t: times, array of shape (n_points,);
+    :return: np.ndarray of shape (n_points, 2).
+    """
+    t = t[:, None]
+    mt = 1 - t
+    mt2 = mt * mt
+    t2 = t * t
+    return (mt2 * mt * ctrl[..., 0, :] + 3 * mt2 * t * ctrl[..., 1, :]
+            + 3 * mt * t2 * ctrl[..., 2, :] + t2 * t * ctrl[..., 3, :])
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _sample_segments(ctrl, counts, offsets, out):
+        """
+        Same as NumPy path of sample_curve(), but without temporary arrays
+        and with segments sampled in parallel.
+        """
+        for s in prange(ctrl.shape[0]):
+            n = counts[s]
+            for i in range(n):
+                t = i / n
+                mt = 1.0 - t
+                b0 = mt * mt * mt
+                b1 = 3.0 * mt * mt * t
+                b2 = 3.0 * mt * t * t
+                b3 = t * t * t
+                for k in range(2):
+                    out[offsets[s] + i, k] = (b0 * ctrl[s, 0, k] + b1 * ctrl[s, 1, k]
+                                              + b2 * ctrl[s, 2, k] + b3 * ctrl[s, 3, k])
+
+
+def save_points(points: np.ndarray, path: str) -> NoReturn:
+    """
+    Save curve points for each frame to JSON file, rounded to POINT_DECIMALS.
+    :param points: array of shape (n_points, 2);
+    :param path: output file name.
+    """
+    xy = np.round(points.astype(np.float64), POINT_DECIMALS).tolist()
+    pp = [{"x": x, "y": y, "idx": i} for i, (x, y) in enumerate(xy)]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(pp, separators=(",", ":")))
@@ -1,30 +1,28 @@
 import sys
-import re
+import os
 import glob
-import decimal
-import json
-from time import sleep
-import xml.etree.ElementTree as ET
-from collections import defaultdict
+import math
 
+import numpy as np
 from typing import NoReturn
 from PyQt5 import QtGui
-from PyQt5.QtGui import QPainter, QBrush, QPen
+from PyQt5.QtGui import QPainter, QBrush, QPen, QPixmap
 from PyQt5 import QtCore
-from PyQt5.QtCore import Qt, pyqtSlot, QPointF
+from PyQt5.QtCore import Qt, pyqtSlot, QPointF, QRect, QTimer
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QFileDialog,
                              QInputDialog, QPushButton, QMessageBox)
 
-import beziers
-from beziers.point import Point
-from beziers.path import BezierPath
-from beziers.path.representations.Nodelist import Node
+from stimuli_generator._bezier import (read_svg_path, parse_svg, segment_lengths,
+                                       sample_curve, save_points)
 
 import warnings
 
 warnings.simplefilter('ignore')
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+POINT_SIZE = 16  # Stimulus pen width (px)
+TICK_MS = 10  # Time between stimulus moves (ms)
+
 
 class Window(QMainWindow):
     # QMainWindow
@@ -45,10 +43,14 @@ class Window(QMainWindow):
         self.init_window()
         # Translate chosen curve to points
         self.points = self.curve_as_points()
+        self._qpoints = [QPointF(x, y) for x, y in self.points.tolist()]
         self.point = self.points[0]
+        self._qpoint = self._qpoints[0]
+        self._prev_point = self.point
         self.save_curve_points()
         # Init painting
-        self.painter = self.set_painter()
+        self.set_painter()
+        self.set_timer()
 
     def pick_directory(self):
         folder_path = QFileDialog.getExistingDirectory(None, 'Select a folder:', 'C:\\', QFileDialog.ShowDirsOnly)
@@ -61,10 +63,20 @@ class Window(QMainWindow):
         self.setWindowTitle(self.title)
         self.setGeometry(self.top, self.left, self.width, self.height)
         self.curve_num = self.get_curve_choice()
-        self.curve = self.curves.get(self.curve_num, 0)
+        self._ctrl = self.curves.get(self.curve_num, 0)
+        self._seg_lengths = segment_lengths(self._ctrl)
+        self._total_len = float(self._seg_lengths.sum())
+        self.init_background()
         self.show_info_dialog()
         self.show()
 
+    def init_background(self):
+        """
+        Pre-render window background to offscreen pixmap.
+        """
+        self._bg = QPixmap(self.size())
+        self._bg.fill(Qt.white)
+
     def show_info_dialog(self):
         msg_box = QMessageBox()
         msg_box.setIcon(QMessageBox.Information)
@@ -79,59 +91,46 @@ class Window(QMainWindow):
 
     def set_painter(self):
         """
-        Create and configure QPainter instance.
-        :return: QPainter object.
+        Create and configure pen and brush, reused by each paint event.
+        (QPainter itself is only valid inside paintEvent, so it is created there.)
         """
-        painter = QPainter(self)
-        pen = QtGui.QPen(QtCore.Qt.red, 16)
-        pen.setCapStyle(Qt.RoundCap)
-        painter.setPen(pen)
-        painter.setBrush(QtGui.QBrush(QtCore.Qt.red))
-        return painter
+        self._pen = QtGui.QPen(QtCore.Qt.red, POINT_SIZE)
+        self._pen.setCapStyle(Qt.RoundCap)
+        self._brush = QtGui.QBrush(QtCore.Qt.red)
 
-    def create_curves(self, dir_name: str, verbose: bool):
+    def set_timer(self):
+        """
+        Create timer, that moves stimulus from the event loop.
+        """
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
 
-        def parse_svg_str(svg_str: str):
-            paths = [svg_part.strip(" ZM").split("L") for svg_part in re.split(r"C|L", svg_str)]
-            paths = [[float(elem) for elem in elem[0].split()] for elem in paths if len(elem[0]) > 1]
-            nodes = []
-            for i, path in enumerate(paths):
-                include_flg = "offcurve"
-                if (i == 0) or (i == len(paths) - 1):
-                    nodes.append(Node(x=path[0], y=path[1], type="curve"))
-                else:
-                    assert (len(path) == 6, "Expected Cubic Bezier curve!")
-                    nodes.append(Node(x=path[0], y=path[1], type="offcurve"))
-                    nodes.append(Node(x=path[2], y=path[3], type="offcurve"))
-                    nodes.append(Node(x=path[4], y=path[5], type="curve"))
-            del paths
-            return nodes
-
-        if len(glob.glob(dir_name + "\\*.svg")) == 0:
+    def create_curves(self, dir_name: str, verbose: bool):
+        files = sorted(glob.glob(os.path.join(dir_name, "*.svg")))
+        if not files:
             print("No curves SVG files found in directory!")
             sys.exit(app.exec_())
 
-        curves = defaultdict()
-        for curve_idx, file_name in enumerate(glob.glob(dir_name + "\\*.svg")):
+        curves = {}
+        for curve_idx, file_name in enumerate(files):
             if verbose:
                 print(f"File: {file_name}...")
             try:
-                root = ET.parse(file_name).getroot()
-                path_svg = root[0][0].attrib['d']
-                node_list = parse_svg_str(path_svg)
-                curves[curve_idx] = BezierPath.fromNodelist(node_list)
+                path_svg = read_svg_path(file_name)
+                curves[curve_idx] = parse_svg(path_svg)
             except SyntaxError:
                 print(f"SVG file parsing error occured on file {file_name}.", file=sys.stderr)
             except AssertionError:
                 print("Assertion failed!")
 
         if verbose and len(curves) > 0:
-            for curve_idx, curve in curves.items():
+            for curve_idx, ctrl in curves.items():
                 print(f"\nCurve type #{curve_idx}")
-                print(f"Number of segments: {len(curve.asSegments())}")
-                print(f"Curve length: {curve.length}")
+                print(f"Number of segments: {len(ctrl)}")
+                print(f"Curve length: {segment_lengths(ctrl).sum()}")
 
-        del root, path_svg, node_list
+        del path_svg
         return curves
 
     def get_curve_choice(self):
@@ -143,24 +142,14 @@ class Window(QMainWindow):
             return int(c_num)
 
     def curve_as_points(self):
-
-        def drange(x, y, jump):
-            while x < y:
-                yield float(x)
-                x += decimal.Decimal(jump)
-
-        length = self.curve.length
-        time_step = 1 / length
-        points = [self.curve.pointAtTime(t) for t in drange(0, 1, time_step)]
-        return [[x, y] for (x, y) in zip([p.x for p in points], [p.y for p in points])]
+        n_points = int(math.ceil(self._total_len))
+        return sample_curve(self._ctrl, n_points, self._seg_lengths)
 
     def save_curve_points(self):
         """
         Save curves points for each frame.
         """
-        pp = [{"x": x, "y": y} for x, y in self.points]
-        with open("results/curve#" + str(self.curve_num) + "_stimulus" + '.json', 'w', encoding='utf-8') as f:
-            json.dump(pp, f, ensure_ascii=False, indent=4)
+        save_points(self.points, "results/curve#" + str(self.curve_num) + "_stimulus" + '.json')
 
     # -------------------- DRAWING ------------------------------
 
@@ -168,21 +157,48 @@ class Window(QMainWindow):
         if e.key() == Qt.Key_Space:
             print("Starting session...")
             self.draw_points()
-            print("Session finished.")
 
     def paintEvent(self, ev):
-        self.painter.begin(self)
-        pen = QtGui.QPen(QtCore.Qt.red, 16)
-        pen.setCapStyle(Qt.RoundCap)
-        self.painter.setPen(pen)
-        self.painter.drawPoint(QPointF(self.point[0], self.point[1]))
-        self.painter.end()
+        painter = QPainter(self)
+        painter.setClipRect(ev.rect())
+        painter.drawPixmap(ev.rect(), self._bg, ev.rect())
+        painter.setPen(self._pen)
+        painter.setBrush(self._brush)
+        painter.drawPoint(self._qpoint)
+        painter.end()
+
+    def resizeEvent(self, ev):
+        super().resizeEvent(ev)
+        self.init_background()
 
     def draw_points(self):
-        for point in self.points:
-            self.point = point
-            self.repaint()
-            sleep(0.01)
+        """
+        Start moving stimulus along curve points, one point per timer tick.
+        """
+        self._points_iter = zip(self.points, self._qpoints)
+        self._timer.start(TICK_MS)
+
+    @pyqtSlot()
+    def _tick(self):
+        try:
+            point, qpoint = next(self._points_iter)
+        except StopIteration:
+            self._timer.stop()
+            print("Session finished.")
+            return
+        self._prev_point, self.point = self.point, point
+        self._qpoint = qpoint
+        # Schedule repaint only of the area where stimulus was erased and drawn
+        self.update(self._dirty_rect(self._prev_point, self.point))
+
+    @staticmethod
+    def _dirty_rect(prev_point, point) -> QRect:
+        """
+        Get the widget area covering stimulus at previous and current positions.
+        """
+        r = POINT_SIZE // 2 + 1
+        prev_rect = QRect(int(prev_point[0]) - r, int(prev_point[1]) - r, 2 * r + 1, 2 * r + 1)
+        return prev_rect.united(QRect(int(point[0]) - r, int(point[1]) - r, 2 * r + 1, 2 * r + 1))
 
 
 if __name__ == '__main__':
@@ -1,18 +1,16 @@
 import sys
 import os
-import re
 import cv2
 import tqdm
-import json
-import decimal
+import math
+import queue
+import threading
 import numpy as np
 
-import xml.etree.ElementTree as ET
-from typing import List, Tuple
+from typing import NoReturn, Optional, Tuple
 
-from beziers.point import Point
-from beziers.path import BezierPath
-from beziers.path.representations.Nodelist import Node
+from stimuli_generator._bezier import (read_svg_path, parse_svg, segment_lengths,
+                                       sample_curve, save_points)
 
 import warnings
 
@@ -22,129 +20,181 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 RADIUS = 7
 COLOR = (0, 0, 255)  # Red in BGR
 TITLE = "Stimulus"
-
-
-class Frame:
-
-    def __init__(self, idx: int, stimuli_pos: Point,
-                 h: int, w: int):
-        self._idx = idx
-        self._image = np.full((h, w, 3), 255, dtype=np.uint8)
-        self._point = stimuli_pos
-        self._height = h
-        self._width = w
-        self._draw()
-
-    def _draw(self):
-        # cv2.circle(image, center_coordinates, radius, color, thickness)
-        self._image = cv2.circle(self._image, (int(self._point.x), int(self._point.y)),
-                                 RADIUS, COLOR, -1)
-
-    def show(self):
-        """
-        Displaying the frame.
-        """
-        cv2.imshow(TITLE, self._image)
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
-
-    def get_image(self) -> np.ndarray:
-        return self._image
-
-    def shape(self) -> Tuple[int, int]:
-        return self._image.shape
+WRITE_QUEUE_SIZE = 8  # Max number of drawn frames, waiting to be encoded
+RAW_CODEC = "raw"  # Uncompressed frames, saved to .npy file
+CODEC_EXTENSIONS = {RAW_CODEC: ".npy", "avc1": ".mp4", "mp4v": ".mp4"}  # Other codecs are saved to .avi
 
 
 class VideoSession():
 
     def __init__(self, stimuli_fn: str, fps: int,
-                 screen_params: Tuple[int, int]):
+                 screen_params: Tuple[int, int], codec: str = "MJPG"):
+        """
+        :param stimuli_fn: SVG file with stimulus curve;
+        :param fps: frames per second;
+        :param screen_params: frame (height, width);
+        :param codec: FOURCC code of video codec (e.g. "MJPG", "FFV1")
+                      or "raw" for uncompressed frames in .npy file.
+        """
+        if codec != RAW_CODEC and len(codec) != 4:
+            raise ValueError(f"Codec should be a 4-character FOURCC code or '{RAW_CODEC}', got: '{codec}'.")
         self._stimuli = self.load_stimuli(stimuli_fn)
+        self._seg_lengths = segment_lengths(self._stimuli)
+        self._length = float(self._seg_lengths.sum())
         self._fps = fps
         self._screen_params = screen_params
-
-    def load_stimuli(self, stimuli_fn: str):
+        self._codec = codec
+        # Blank canvas, copied into a frame buffer before drawing each frame
+        self._blank = np.full((*screen_params, 3), 255, dtype=np.uint8)
+        # Stimulus circle, rasterized once and blitted into frames by mask
+        stamp = np.full((2 * RADIUS + 1, 2 * RADIUS + 1, 3), 255, dtype=np.uint8)
+        cv2.circle(stamp, (RADIUS, RADIUS), RADIUS, COLOR, -1)
+        self._stamp_mask = (stamp != 255).any(axis=2)
+        # Error raised in encoding thread, re-raised in the calling one
+        self._write_error = None
+
+    def load_stimuli(self, stimuli_fn: str) -> np.ndarray:
         if os.path.isfile(stimuli_fn):
             try:
-                root = ET.parse(stimuli_fn).getroot()
-                path_svg = root[0][0].attrib['d']
-                node_list = parse_svg_str(path_svg)
-                curve = BezierPath.fromNodelist(node_list)
+                path_svg = read_svg_path(stimuli_fn)
+                ctrl = parse_svg(path_svg)
             except SyntaxError:
                 print(f"SVG file parsing error occured on file {stimuli_fn}.", file=sys.stderr)
             except AssertionError:
                 print("Assertion failed!")
-        return curve
-
-    def start(self, tpf: float, out_dir: str, out_fn: str):
-        points = curve_as_points(self._stimuli, tpf)
-        print(
-            f"Will be created {len(points)} frames from stimuli curve of length {self._stimuli.length} with FPS {self._fps}")
-        if len(points) < 1:
-            return
-        out_path = os.path.join(out_dir, out_fn + ".avi")
+        return ctrl
 
-        fourcc = cv2.VideoWriter_fourcc('M', 'J', 'P', 'G')
+    def _draw_frame(self, frame: np.ndarray, point: np.ndarray) -> np.ndarray:
+        """
+        Draw stimulus at given position in place, on the reused frame buffer.
+        :param frame: frame buffer to draw on;
+        :param point: (x, y) pixel position of stimulus;
+        :return: frame image.
+        """
+        np.copyto(frame, self._blank)
+        # Same pixels as cv2.circle(frame, (x, y), RADIUS, COLOR, -1), clipped at borders
+        h, w = frame.shape[:2]
+        x0, y0 = point[0] - RADIUS, point[1] - RADIUS
+        left, top = max(x0, 0), max(y0, 0)
+        right, bottom = min(x0 + 2 * RADIUS + 1, w), min(y0 + 2 * RADIUS + 1, h)
+        if left < right and top < bottom:
+            mask = self._stamp_mask[top - y0:bottom - y0, left - x0:right - x0]
+            frame[top:bottom, left:right][mask] = COLOR
+        return frame
+
+    def _write_frames(self, out_video: cv2.VideoWriter, frames: queue.Queue, free_frames: queue.Queue):
+        """
+        Encode drawn frames until None is received, returning buffers to the pool.
+        Runs in a separate thread, as OpenCV releases the GIL while encoding.
+        After an encoding error frames are only recycled, so the drawing thread never blocks;
+        the error is stored to be re-raised by the drawing thread.
+        """
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            if self._write_error is None:
+                try:
+                    out_video.write(frame)
+                except BaseException as e:
+                    self._write_error = e
+            free_frames.put(frame)
+
+    def _write_video(self, pixels: np.ndarray, out_path: str):
+        """
+        Encode frames to video file with session codec.
+        :param pixels: stimulus pixel positions, integer array of shape (n_frames, 2);
+        :param out_path: output video file name.
+        """
+        fourcc = cv2.VideoWriter_fourcc(*self._codec)
         out_video = cv2.VideoWriter()
 
         success = out_video.open(out_path, fourcc, self._fps, (self._screen_params[1], self._screen_params[0]), True)
         if success:
             print(f"Started writing video to: {out_path}...")
-            for idx, point in tqdm.tqdm(enumerate(points), total=len(points)):
-                frame = Frame(idx, point, *self._screen_params)
-                out_video.write(frame.get_image())
+            # Frame buffers, cycled between drawing and encoding threads
+            free_frames = queue.Queue()
+            for _ in range(WRITE_QUEUE_SIZE + 2):
+                free_frames.put(np.empty_like(self._blank))
+            frames = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+            self._write_error = None
+            writer = threading.Thread(target=self._write_frames, args=(out_video, frames, free_frames))
+            writer.start()
+            try:
+                for idx, point in tqdm.tqdm(enumerate(pixels.tolist()), total=len(pixels), mininterval=0.2,
+                                            miniters=max(1, len(pixels) // 200)):
+                    if self._write_error is not None:
+                        break
+                    frames.put(self._draw_frame(free_frames.get(), point))
+            finally:
+                frames.put(None)
+                writer.join()
         else:
             print(f"Failed to open video file: {out_path}.", file=sys.stderr)
 
         out_video.release()
-        print(f"Finished writing video.")
-        save_curve_points(points, out_dir, out_fn)
-        print(f"Stimulus path saved to: {os.path.join(out_dir, out_fn + '.json')}.")
-
+        if self._write_error is not None:
+            raise self._write_error
 
-# ------------------- utils ------------------------
+    def _write_raw(self, pixels: np.ndarray, out_path: str):
+        """
+        Draw frames directly into memory-mapped .npy file of shape (n_frames, h, w, 3),
+        without any compression.
+        :param pixels: stimulus pixel positions, integer array of shape (n_frames, 2);
+        :param out_path: output .npy file name.
+        """
+        print(f"Started writing raw frames to: {out_path}...")
+        video = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.uint8,
+                                          shape=(len(pixels), *self._blank.shape))
+        for idx, point in tqdm.tqdm(enumerate(pixels.tolist()), total=len(pixels), mininterval=0.2,
+                                    miniters=max(1, len(pixels) // 200)):
+            self._draw_frame(video[idx], point)
+        video.flush()
+        del video
 
-def parse_svg_str(svg_str: str):
-    paths = [svg_part.strip(" ZM").split("L") for svg_part in re.split(r"C|L", svg_str)]
-    paths = [[float(elem) for elem in elem[0].split()] for elem in paths if len(elem[0]) > 1]
-    nodes = []
-    for i, path in enumerate(paths):
-        if (i == 0) or (i == len(paths) - 1):
-            nodes.append(Node(x=path[0], y=path[1], type="curve"))
+    def start(self, tpf: float, out_dir: str, out_fn: str):
+        points = curve_as_points(self._stimuli, tpf, self._seg_lengths)
+        print(
+            f"Will be created {len(points)} frames from stimuli curve of length {self._length} with FPS {self._fps}")
+        if len(points) < 1:
+            return
+        out_path = os.path.join(out_dir, out_fn + CODEC_EXTENSIONS.get(self._codec, ".avi"))
+        # Integer pixel positions, converted once for drawing
+        pixels = points.round().astype(np.int16)
+        if self._codec == RAW_CODEC:
+            self._write_raw(pixels, out_path)
         else:
-            nodes.append(Node(x=path[0], y=path[1], type="offcurve"))
-            nodes.append(Node(x=path[2], y=path[3], type="offcurve"))
-            nodes.append(Node(x=path[4], y=path[5], type="curve"))
-    del paths
-    return nodes
+            self._write_video(pixels, out_path)
+        print(f"Finished writing video.")
+        points_path = os.path.join(out_dir, out_fn + '.json')
+        save_points(points, points_path)
+        print(f"Stimulus path saved to: {points_path}.")
 
 
-def curve_as_points(curve: BezierPath, tpf: float) -> List[Point]:
+# ------------------- utils ------------------------
+
+def show_frame(image: np.ndarray) -> NoReturn:
     """
-    Return curve as points.
-    :param curve: BezierCurve object;
-    :param tpf: time per frame (s) - speed of moving along curve;
-    :return: List[Point]
+    Displaying the frame.
     """
-
-    def drange(x, y, jump):
-        while x < y:
-            yield float(x)
-            x += decimal.Decimal(jump)
-
-    time_step = 1 / (curve.length * tpf)
-    points = [curve.pointAtTime(t) for t in drange(0, 1, time_step)]
-    return points
+    cv2.imshow(TITLE, image)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
 
 
-def save_curve_points(points: List[Point],
-                      out_dir: str, out_fn: str) -> NoReturn:
+def curve_as_points(ctrl: np.ndarray, tpf: float,
+                    seg_lengths: Optional[np.ndarray] = None) -> np.ndarray:
     """
-    Save curves points for each frame.
+    Return curve as points.
+    :param ctrl: curve segments control points, array of shape (n_segments, 4, 2);
+    :param tpf: time per frame (s) - speed of moving along curve;
+    :param seg_lengths: precomputed lengths of curve segments (computed if not given);
+    :return: np.float32 array of shape (n_points, 2) with (x, y) coordinates.
     """
-    pp = [{"x": point.x, "y": point.y, "idx": i} for i, point in enumerate(points)]
-    with open(os.path.join(out_dir, out_fn) + '.json', 'w', encoding='utf-8') as f:
-        json.dump(pp, f, ensure_ascii=False, indent=4)
+    if seg_lengths is None:
+        seg_lengths = segment_lengths(ctrl)
+    n_points = int(math.ceil(seg_lengths.sum() * tpf))
+    return sample_curve(ctrl, n_points, seg_lengths)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from beziers.path import BezierPath
+from beziers.path.representations.Nodelist import Node
+
+from stimuli_generator import _bezier
+
+# Closed path ending at its start, and one that needs a closing line
+PATHS = ["M 100 200 C 300 400 500 60 700 80 C 90 100 120 130 200 150 L 100 200 Z",
+         "M 100 200 C 300 400 500 60 700 80\nC 90 100 120 130 200 150\nL 150 210 Z"]
+
+
+def nodelist_path(svg_str: str) -> BezierPath:
+    """
+    Build path the way it was built from SVG before parse_svg():
+    start point, cubic curves and final line node.
+    """
+    paths = [[float(v) for v in part.split()]
+             for part in svg_str.replace("M", "C").replace("L", "C").replace("Z", "").split("C")
+             if part.strip()]
+    nodes = []
+    for i, path in enumerate(paths):
+        if (i == 0) or (i == len(paths) - 1):
+            nodes.append(Node(x=path[0], y=path[1], type="curve"))
+        else:
+            nodes.append(Node(x=path[0], y=path[1], type="offcurve"))
+            nodes.append(Node(x=path[2], y=path[3], type="offcurve"))
+            nodes.append(Node(x=path[4], y=path[5], type="curve"))
+    return BezierPath.fromNodelist(nodes)
+
+
+@pytest.mark.parametrize("svg_str", PATHS)
+def test_parse_svg_matches_nodelist_segments(svg_str):
+    ctrl = _bezier.parse_svg(svg_str)
+    segs = nodelist_path(svg_str).asSegments()
+    assert ctrl.shape == (len(segs), 4, 2)
+    ts = np.linspace(0.0, 1.0, 11)
+    for seg_ctrl, seg in zip(ctrl, segs):
+        expected = np.array([[p.x, p.y] for p in map(seg.pointAtTime, ts)])
+        np.testing.assert_allclose(_bezier.cubic_bezier(seg_ctrl, ts), expected, atol=1e-9)
+
+
+@pytest.mark.parametrize("svg_str", PATHS)
+def test_segment_lengths_match_beziers(svg_str):
+    lengths = _bezier.segment_lengths(_bezier.parse_svg(svg_str))
+    expected = [seg.length for seg in nodelist_path(svg_str).asSegments()]
+    np.testing.assert_allclose(lengths, expected, rtol=1e-9)
+
+
+def test_parse_svg_rejects_path_without_final_line():
+    with pytest.raises(AssertionError):
+        _bezier.parse_svg("M 100 200 C 300 400 500 60 700 80 Z")
+
+
+def test_save_points_rounds_coordinates(tmp_path):
+    fn = tmp_path / "points.json"
+    _bezier.save_points(np.array([[1.23456, 2.0], [3.0, 4.98765]], dtype=np.float32), str(fn))
+    assert json.loads(fn.read_text()) == [{"x": 1.235, "y": 2.0, "idx": 0},
+                                          {"x": 3.0, "y": 4.988, "idx": 1}]
+
+
+@pytest.mark.parametrize("svg_str", PATHS)
+def test_sample_curve_numba_matches_numpy(svg_str, monkeypatch):
+    pytest.importorskip("numba")
+    ctrl = _bezier.parse_svg(svg_str)
+    n_points = 2 * _bezier.NUMBA_MIN_POINTS
+    fast = _bezier.sample_curve(ctrl, n_points)
+    monkeypatch.setattr(_bezier, "njit", None)
+    plain = _bezier.sample_curve(ctrl, n_points)
+    assert fast.dtype == plain.dtype == np.float32
+    np.testing.assert_allclose(fast, plain, atol=1e-3)
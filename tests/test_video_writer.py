@@ -0,0 +1,54 @@
+import threading
+
+import numpy as np
+import pytest
+
+from stimuli_generator import video_writer
+
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg"><g><path d="'
+       'M 100 200 C 300 400 500 60 700 80 C 90 100 120 130 200 150 L 100 200 Z"/></g></svg>')
+
+
+@pytest.fixture
+def stimuli_fn(tmp_path):
+    fn = tmp_path / "curve.svg"
+    fn.write_text(SVG)
+    return str(fn)
+
+
+class FailingVideoWriter:
+
+    def open(self, *args):
+        return True
+
+    def write(self, frame):
+        raise IOError("Encoding failed")
+
+    def release(self):
+        pass
+
+
+def test_write_video_raises_encoding_error(stimuli_fn, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_writer.cv2, "VideoWriter", FailingVideoWriter)
+    vs = video_writer.VideoSession(stimuli_fn, fps=30, screen_params=(80, 100))
+    # More frames than buffers in the pool, so a stuck encoder would block drawing
+    pixels = np.zeros((5 * video_writer.WRITE_QUEUE_SIZE, 2), dtype=np.int16)
+    errors = []
+
+    def write():
+        try:
+            vs._write_video(pixels, str(tmp_path / "out.avi"))
+        except IOError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "Video writing deadlocked after encoding error"
+    assert len(errors) == 1 and str(errors[0]) == "Encoding failed"
+
+
+@pytest.mark.parametrize("codec", ["h264x", "rw", ""])
+def test_invalid_codec_rejected(stimuli_fn, codec):
+    with pytest.raises(ValueError):
+        video_writer.VideoSession(stimuli_fn, fps=30, screen_params=(80, 100), codec=codec)